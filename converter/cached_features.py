@@ -1,134 +1,188 @@
+import functools
 import json
 import os
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+try:  # orjson parses and serializes several times faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
 import pandas as pd
 import numpy as np
 import functions as fn
 
 # Helper functions from the notebook
 def test_col2i64_list_of_field(test_col):
-    def num2i64_field(x):
-        if x>=0:
-            sgn = 1
-        else:
-            sgn = 0
-        return f'{sgn}", "{abs(x)}'
-    
-    instr = '"'
-    for i in test_col:
-       # instr+= f'"{int(np.round(i*10000000000,0))}", '
-        instr+=num2i64_field(int(np.round(i*10000000000,0)))
-        instr+='", "'
-    instr = instr[:-3]
-    return instr
-
-# Original functions from the notebook (modified to return both feature_names and instr)
-def get_feature_names_instr_1():
-    test, integer_labels, actual_labels, integer_labels_full = fn.load_test_data('../processed/',1,1)
-    test = test.loc[:,test.mean() != -99999]
-    feature_names = list(test.columns.to_numpy())
-    instr = test_col2i64_list_of_field(test.iloc[1])
-    return feature_names, instr
+    # Scale and round the whole row in one vectorized pass instead of
+    # calling np.round per element.
+    arr = np.rint(np.asarray(test_col, dtype=np.float64) * 10000000000).astype(np.int64)
+    signs = np.where(arr >= 0, '1', '0')
+    mags = np.char.mod('%d', np.abs(arr))
+    parts = np.char.add(np.char.add(signs, '", "'), mags)
+    return '"' + '", "'.join(parts) + '"'
+
+_XTRA_TYPES = ['TimeToEnd','Reflectivity','Zdr','RR2','ReflectivityQC','RadarQualityIndex','RR3','RR1','Composite','RhoHV','HybridScan','LogWaterVolume']
+
+def _read_xtra_test(suffix):
+    # the 12 reads are independent and I/O bound, so issue them concurrently
+    # (pandas' C csv parser releases the GIL)
+    with ThreadPoolExecutor(max_workers=min(len(_XTRA_TYPES), os.cpu_count())) as ex:
+        xtra_dfs = list(ex.map(lambda t: pd.read_csv(f'../processed/test_{t}{suffix}.csv',index_col=0), _XTRA_TYPES))
+    return pd.concat(xtra_dfs,axis=1)
+
+# model number -> (count lower bound, count upper bound, xtra-file suffix)
+MODEL_SPECS = {
+    1: (1, 1, None),
+    2: (1, 4, None),
+    3: (3, 8, None),
+    4: (7, 18, '8_17'),
+    5: (17, 1000, '18_199'),
+}
+
+def get_feature_names_instr(i, use_xtra_features=True):
+    if i not in MODEL_SPECS:
+        print("Try to get features out of the scope.")
+        return None, None
+    lower, upper, xtra_suffix = MODEL_SPECS[i]
 
-def get_feature_names_instr_2():
-    test, integer_labels, actual_labels, integer_labels_full = fn.load_test_data('../processed/',1,4)
-    feature_names = list(test.columns.to_numpy())
-    instr = test_col2i64_list_of_field(test.iloc[1])
-    return feature_names, instr
+    if i == 1:
+        # model 1 drops constant columns, which needs per-column means over
+        # the full test set
+        test, integer_labels, actual_labels, integer_labels_full = fn.load_test_data('../processed/',lower,upper)
+        test = test.loc[:,test.mean() != -99999]
+        feature_names = list(test.columns.to_numpy())
+        return feature_names, test_col2i64_list_of_field(test.iloc[1])
 
-def get_feature_names_instr_3():
-    test, integer_labels, actual_labels, integer_labels_full = fn.load_test_data('../processed/',3,8)
-    feature_names = list(test.columns.to_numpy())
-    instr = test_col2i64_list_of_field(test.iloc[1])
-    return feature_names, instr
+    # column list and the single instr row are all we need; skip the full load
+    feature_names = fn.load_test_columns('../processed/')
+    test_row = fn.load_test_row('../processed/',lower,upper)
 
-def get_feature_names_instr_4(use_xtra_features = True):
-    test, integer_labels, actual_labels, integer_labels_full = fn.load_test_data('../processed/',7,18)
+    if xtra_suffix is not None and use_xtra_features:
+        xtra_test = _read_xtra_test(xtra_suffix)
+        feature_names += list(xtra_test.columns.to_numpy())
+        test_row = pd.concat([test_row, xtra_test.reindex([test_row.name]).iloc[0]])
 
-    if use_xtra_features:
-        types = ['TimeToEnd','Reflectivity','Zdr','RR2','ReflectivityQC','RadarQualityIndex','RR3','RR1','Composite','RhoHV','HybridScan','LogWaterVolume']
-        xtra_test = pd.DataFrame()
-        for i in range(len(types)):
-            xtra_test_temp = pd.read_csv('../processed/'+'test_'+types[i]+'8_17.csv',index_col=0)
-            xtra_test = pd.concat([xtra_test,xtra_test_temp],axis=1)
+    return feature_names, test_col2i64_list_of_field(test_row)
 
-        xtra_test = xtra_test.reindex(test.index)
-        test= pd.concat([test, xtra_test],axis=1)
-    feature_names = list(test.columns.to_numpy())
-    instr = test_col2i64_list_of_field(test.iloc[1])
-    return feature_names, instr
-
-def get_feature_names_instr_5(use_xtra_features = True):
-    test, integer_labels, actual_labels, integer_labels_full = fn.load_test_data('../processed/',17,1000)
+# thin shims kept for callers of the old per-model functions
+def get_feature_names_instr_1():
+    return get_feature_names_instr(1)
 
-    if use_xtra_features:
-        types = ['TimeToEnd','Reflectivity','Zdr','RR2','ReflectivityQC','RadarQualityIndex','RR3','RR1','Composite','RhoHV','HybridScan','LogWaterVolume']
-        xtra_test = pd.DataFrame()
-        for i in range(len(types)):
-            xtra_test_temp = pd.read_csv('../processed/'+'test_'+types[i]+'18_199.csv',index_col=0)
-            xtra_test = pd.concat([xtra_test,xtra_test_temp],axis=1)
+def get_feature_names_instr_2():
+    return get_feature_names_instr(2)
 
-        xtra_test = xtra_test.reindex(test.index)
-        test= pd.concat([test, xtra_test],axis=1)
+def get_feature_names_instr_3():
+    return get_feature_names_instr(3)
 
-    feature_names = list(test.columns.to_numpy())
-    instr = test_col2i64_list_of_field(test.iloc[1])
-    return feature_names, instr
+def get_feature_names_instr_4(use_xtra_features = True):
+    return get_feature_names_instr(4, use_xtra_features)
 
-def get_feature_names_instr(i, use_xtra_features):
-    if i == 1:
-        return get_feature_names_instr_1()
-    elif i == 2:
-        return get_feature_names_instr_2()
-    elif i == 3:
-        return get_feature_names_instr_3()
-    elif i == 4:
-        return get_feature_names_instr_4(use_xtra_features)
-    elif i == 5:
-        return get_feature_names_instr_5(use_xtra_features)
-    else:
-        print("Try to get features out of the scope.")
-        return None, None
+def get_feature_names_instr_5(use_xtra_features = True):
+    return get_feature_names_instr(5, use_xtra_features)
 
-def save_feature_names_cache(cache_file='feature_names_cache.json'):
-    """
-    Generate and save feature names and instr for all models to a cache file using original functions.
-    Run this once to create the cache.
-    """
-    cache = {}
-    
-    print("Generating feature names and instr cache (this may take a while)...")
-    
+def _iter_cache_records():
+    """Yield (key, record) cache entries one model at a time."""
     # Models 1-3 don't use extra features
     for model_num in range(1, 4):
         print(f"Processing model {model_num}...")
         feature_names, instr = get_feature_names_instr(model_num, False)
-        cache[f'model_{model_num}'] = {
+        yield f'model_{model_num}', {
             'feature_names': feature_names,
             'instr': instr
         }
-    
+
     # Models 4-5 have both with and without extra features
     for model_num in range(4, 6):
         print(f"Processing model {model_num} with extra features...")
         feature_names, instr = get_feature_names_instr(model_num, True)
-        cache[f'model_{model_num}_with_xtra'] = {
+        yield f'model_{model_num}_with_xtra', {
             'feature_names': feature_names,
             'instr': instr
         }
         print(f"Processing model {model_num} without extra features...")
         feature_names, instr = get_feature_names_instr(model_num, False)
-        cache[f'model_{model_num}_no_xtra'] = {
+        yield f'model_{model_num}_no_xtra', {
             'feature_names': feature_names,
             'instr': instr
         }
-    
-    with open(cache_file, 'w') as f:
-        json.dump(cache, f, indent=2)
-    
+
+def save_feature_names_cache(cache_file='feature_names_cache.pkl'):
+    """
+    Generate and save feature names and instr for all models to a cache file using original functions.
+    Run this once to create the cache.
+    """
+    print("Generating feature names and instr cache (this may take a while)...")
+
+    # JSON kept as a fallback format for old cache files; pickle is much
+    # faster to read/write for the huge instr strings.
+    if cache_file.endswith('.json'):
+        cache = dict(_iter_cache_records())
+        if orjson is not None:
+            with open(cache_file, 'wb') as f:
+                f.write(orjson.dumps(cache, option=orjson.OPT_INDENT_2))
+        else:
+            with open(cache_file, 'w') as f:
+                json.dump(cache, f, indent=2)
+    else:
+        # Stream one pickle frame per model so each record hits disk as soon
+        # as it is generated instead of buffering the whole dict at the end
+        cache = {}
+        with open(cache_file, 'wb') as f:
+            for key, record in _iter_cache_records():
+                pickle.dump((key, record), f, protocol=5)
+                f.flush()
+                cache[key] = record
+
+    # Drop any stale memoized copy of the old cache contents
+    _read_cache.cache_clear()
+
     print(f"Feature names and instr cached to {cache_file}")
     return cache
 
-def load_feature_names_from_cache(model_num, use_xtra_features=True, cache_file='feature_names_cache.json'):
+@functools.lru_cache(maxsize=8)
+def _read_cache(cache_file):
+    """Parse the cache file once per process; repeated loads hit the memo."""
+    if cache_file.endswith('.json'):
+        if orjson is not None:
+            with open(cache_file, 'rb') as f:
+                return orjson.loads(f.read())
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    with open(cache_file, 'rb') as f:
+        first = pickle.load(f)
+        if isinstance(first, dict):
+            # old format: one pickled dict holding every model
+            return first
+        # streamed format: a sequence of (key, record) frames
+        cache = dict([first])
+        while True:
+            try:
+                key, record = pickle.load(f)
+            except EOFError:
+                break
+            cache[key] = record
+        return cache
+
+def _get_cache(cache_file):
+    """Return the parsed cache dict, building the cache file if missing."""
+    if not os.path.exists(cache_file):
+        # Fall back to a legacy JSON cache next to the requested file before
+        # paying for a full rebuild.
+        legacy = os.path.splitext(cache_file)[0] + '.json'
+        if legacy != cache_file and os.path.exists(legacy):
+            return _read_cache(legacy)
+        print(f"Cache file {cache_file} not found. Creating cache...")
+        save_feature_names_cache(cache_file=cache_file)
+    return _read_cache(cache_file)
+
+def _cache_key(model_num, use_xtra_features):
+    if model_num in [4, 5]:
+        return f'model_{model_num}_{"with_xtra" if use_xtra_features else "no_xtra"}'
+    else:
+        return f'model_{model_num}'
+
+def load_feature_names_from_cache(model_num, use_xtra_features=True, cache_file='feature_names_cache.pkl'):
     """
     Load feature names from cache file - extremely fast.
     
@@ -140,21 +194,10 @@ def load_feature_names_from_cache(model_num, use_xtra_features=True, cache_file=
     Returns:
         List of feature names
     """
-    if not os.path.exists(cache_file):
-        print(f"Cache file {cache_file} not found. Creating cache...")
-        save_feature_names_cache(cache_file=cache_file)
-    
-    with open(cache_file, 'r') as f:
-        cache = json.load(f)
-    
-    if model_num in [4, 5]:
-        key = f'model_{model_num}_{"with_xtra" if use_xtra_features else "no_xtra"}'
-    else:
-        key = f'model_{model_num}'
-    
-    return cache[key]['feature_names']
+    cache = _get_cache(cache_file)
+    return cache[_cache_key(model_num, use_xtra_features)]['feature_names']
 
-def load_instr_from_cache(model_num, use_xtra_features=True, cache_file='feature_names_cache.json'):
+def load_instr_from_cache(model_num, use_xtra_features=True, cache_file='feature_names_cache.pkl'):
     """
     Load instruction vector from cache file - extremely fast.
     
@@ -166,21 +209,10 @@ def load_instr_from_cache(model_num, use_xtra_features=True, cache_file='feature
     Returns:
         Instruction string for the model
     """
-    if not os.path.exists(cache_file):
-        print(f"Cache file {cache_file} not found. Creating cache...")
-        save_feature_names_cache(cache_file=cache_file)
-    
-    with open(cache_file, 'r') as f:
-        cache = json.load(f)
-    
-    if model_num in [4, 5]:
-        key = f'model_{model_num}_{"with_xtra" if use_xtra_features else "no_xtra"}'
-    else:
-        key = f'model_{model_num}'
-    
-    return cache[key]['instr']
+    cache = _get_cache(cache_file)
+    return cache[_cache_key(model_num, use_xtra_features)]['instr']
 
-def load_feature_names_and_instr_from_cache(model_num, use_xtra_features=True, cache_file='feature_names_cache.json'):
+def load_feature_names_and_instr_from_cache(model_num, use_xtra_features=True, cache_file='feature_names_cache.pkl'):
     """
     Load both feature names and instruction vector from cache file - extremely fast.
     
@@ -192,16 +224,6 @@ def load_feature_names_and_instr_from_cache(model_num, use_xtra_features=True, c
     Returns:
         Tuple of (feature_names, instr)
     """
-    if not os.path.exists(cache_file):
-        print(f"Cache file {cache_file} not found. Creating cache...")
-        save_feature_names_cache(cache_file=cache_file)
-    
-    with open(cache_file, 'r') as f:
-        cache = json.load(f)
-    
-    if model_num in [4, 5]:
-        key = f'model_{model_num}_{"with_xtra" if use_xtra_features else "no_xtra"}'
-    else:
-        key = f'model_{model_num}'
-    
-    return cache[key]['feature_names'], cache[key]['instr']
\ No newline at end of file
+    cache = _get_cache(cache_file)
+    entry = cache[_cache_key(model_num, use_xtra_features)]
+    return entry['feature_names'], entry['instr']
\ No newline at end of file
@@ -30,6 +30,7 @@ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS" AND
 """
 
 
+import os
 import pandas as pd
 import numpy as np
 import sys
@@ -40,16 +41,66 @@ import xgboost as xgb
 
 # takes the ceiling of the actual labels, aggregates values above the cutoff
 def discretize_labels(labels,cutoff=69):
-    new_labels = np.zeros(len(labels.index))
-    for e,i in enumerate(labels.values.ravel()):
-        if i > cutoff:
-            new_labels[e] = 70
-        elif i <= cutoff and i >= cutoff:
-            new_labels[e] = cutoff
-        else:
-            new_labels[e] = np.ceil(i)
+    arr = labels.values.ravel().astype(float)
+    new_labels = np.ceil(arr)
+    new_labels = np.where(arr > cutoff, 70.0, new_labels)
     return pd.DataFrame(np.abs(new_labels))
 
+# reads a csv through a parquet side-car cache: the first read parses the csv
+# and writes path + '.parquet' next to it, later reads hit the much faster
+# columnar file instead of reparsing text
+def _read_cached_csv(path, **kwargs):
+    parquet_path = path + '.parquet'
+    if os.path.exists(parquet_path):
+        return pd.read_parquet(parquet_path)
+    df = pd.read_csv(path, **kwargs)
+    try:
+        df.to_parquet(parquet_path)
+    except ImportError:
+        # no parquet engine (pyarrow/fastparquet) installed; keep the parsed
+        # frame and just skip writing the side-car
+        pass
+    return df
+
+# columns dropped from the test set in load_test_data/load_test_row
+_TEST_DROP_COLS = ['DistanceToRadar_' + x for x in ['sum','mad','sem','krt','skw','max','min','std','mean','med','num_non_null']] + [ 'HybridScan_num_00','HybridScan_num_03','RadarQualityIndex_num_99']
+
+# applies the count bounds the same way load_test_data does
+def _query_counts(counts, lower_bound, upper_bound):
+    if lower_bound == upper_bound:
+        return counts.query('cnt==@lower_bound')
+    return counts.query('cnt > @lower_bound and cnt < @upper_bound')
+
+# reads a single row (by index label) out of a csv without parsing the rest:
+# one cheap pass over the index column to find the line number, then a
+# skiprows read that keeps only the header and that line
+def _read_csv_single_row(path, label):
+    idx = pd.read_csv(path, usecols=[0], index_col=0).index
+    pos = idx.get_loc(label)
+    keep = {0, pos + 1}
+    return pd.read_csv(path, index_col=0, skiprows=lambda r: r not in keep)
+
+# returns the test-set column names without loading any data rows
+def load_test_columns(path_to_processed_data):
+    full_cols = pd.read_csv(path_to_processed_data + 'full_test.csv', index_col=0, nrows=0).columns
+    hydro_cols = pd.read_csv(path_to_processed_data + 'test_HydrometeorType_counts.csv', index_col=0, nrows=0).columns
+    return [c for c in list(full_cols) + list(hydro_cols) if c not in _TEST_DROP_COLS]
+
+# loads one row of the filtered test set (row_pos within the count-filtered
+# index) without reading the full test csvs; returns a Series matching
+# load_test_data(...)[0].iloc[row_pos]
+def load_test_row(path_to_processed_data, lower_bound, upper_bound, row_pos=1):
+    test_counts = _read_cached_csv(path_to_processed_data + 'test_counts.csv',index_col=0)
+    test_counts.columns = ['cnt']
+    test_counts = _query_counts(test_counts, lower_bound, upper_bound)
+    label = test_counts.index[row_pos]
+
+    full_row = _read_csv_single_row(path_to_processed_data + 'full_test.csv', label)
+    hydro_row = _read_csv_single_row(path_to_processed_data + 'test_HydrometeorType_counts.csv', label)
+    row = pd.concat([full_row, hydro_row],axis=1)
+    row = row.drop(_TEST_DROP_COLS, axis=1)
+    return row.iloc[0]
+
 #Creates a xgboost object and loads model
 def load_xgb_model(path_to_model):
     bst = xgb.Booster()
@@ -58,20 +109,20 @@ def load_xgb_model(path_to_model):
 
 # loads the test data between lower and upper bound, 
 def load_test_data(path_to_processed_data, lower_bound,upper_bound):
-    full_test = pd.read_csv(path_to_processed_data + 'full_test.csv',index_col=0)
-    hydro_test = pd.read_csv(path_to_processed_data + 'test_HydrometeorType_counts.csv',index_col=0)
+    full_test = _read_cached_csv(path_to_processed_data + 'full_test.csv',index_col=0)
+    hydro_test = _read_cached_csv(path_to_processed_data + 'test_HydrometeorType_counts.csv',index_col=0)
     full_test = pd.concat([full_test, hydro_test],axis=1)
 
     # test_counts = pd.read_csv(path_to_processed_data + 'test_counts.csv',index_col=0,header=None)
-    test_counts = pd.read_csv(path_to_processed_data + 'test_counts.csv',index_col=0)
+    test_counts = _read_cached_csv(path_to_processed_data + 'test_counts.csv',index_col=0)
     test_counts.columns = ['cnt']
 
     # train_counts = pd.read_csv(path_to_processed_data + 'train_counts.csv',index_col=0,header=None)
-    train_counts = pd.read_csv(path_to_processed_data + 'train_counts.csv',index_col=0)
+    train_counts = _read_cached_csv(path_to_processed_data + 'train_counts.csv',index_col=0)
     train_counts.columns = ['cnt']
 
     # actual_labels = pd.read_csv(path_to_processed_data + 'actual_labels.csv',index_col=0,header=None)
-    actual_labels = pd.read_csv(path_to_processed_data + 'actual_labels.csv',index_col=0)
+    actual_labels = _read_cached_csv(path_to_processed_data + 'actual_labels.csv',index_col=0)
     actual_labels.columns = ['label']
 
     discrete_labels = discretize_labels(actual_labels)
@@ -80,12 +131,8 @@ def load_test_data(path_to_processed_data, lower_bound,upper_bound):
 
     
     #now take just the parts needed for this problem
-    if lower_bound == upper_bound:
-        test_counts =  test_counts.query('cnt==@lower_bound')
-        train_counts = train_counts.query('cnt==@lower_bound')
-    else:
-        test_counts =  test_counts.query('cnt > @lower_bound and cnt < @upper_bound')
-        train_counts =  train_counts.query('cnt > @lower_bound and cnt < @upper_bound')
+    test_counts = _query_counts(test_counts, lower_bound, upper_bound)
+    train_counts = _query_counts(train_counts, lower_bound, upper_bound)
 
     discrete_labels = discrete_labels.reindex(train_counts.index)
     #get rid of all the labels with rain amount >=70
@@ -97,6 +144,5 @@ def load_test_data(path_to_processed_data, lower_bound,upper_bound):
     test = full_test.reindex(test_counts.index) 
     actual_labels = actual_labels.reindex(train_counts.index)
 
-    to_drop = ['DistanceToRadar_' + x for x in ['sum','mad','sem','krt','skw','max','min','std','mean','med','num_non_null']] + [ 'HybridScan_num_00','HybridScan_num_03','RadarQualityIndex_num_99']
-    test = test.drop(to_drop, axis=1)
+    test = test.drop(_TEST_DROP_COLS, axis=1)
     return test, discrete_labels,actual_labels, discrete_labels_all
\ No newline at end of file
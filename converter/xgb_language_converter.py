@@ -1,8 +1,79 @@
+import functools
 import json
 import os
+import weakref
+from string import Template
 import numpy as np
 from typing import Dict, Any, List, Tuple
 
+try:  # orjson parses several times faster than stdlib json
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Raw tree dumps and lazily parsed trees per booster, so converting the same
+# booster repeatedly (benchmarks, multiple target languages) doesn't redo
+# get_dump or json parsing. Weak keys let the cached trees die with the
+# booster.
+_trees_cache = weakref.WeakKeyDictionary()
+
+def _iter_parsed_trees(booster, num_trees: int):
+    """Yield the booster's first num_trees trees as parsed dicts.
+
+    get_dump returns every tree's JSON up front, but each dump is only
+    parsed when this generator reaches it, so asking for a prefix of an
+    early-stopped booster never pays for the tail. Parsed trees are
+    memoized per booster.
+    """
+    try:
+        raw_dumps, parsed = _trees_cache[booster]
+    except KeyError:
+        raw_dumps = booster.get_dump(dump_format='json')
+        parsed = [None] * len(raw_dumps)
+        _trees_cache[booster] = (raw_dumps, parsed)
+    for tree_idx in range(min(num_trees, len(raw_dumps))):
+        if parsed[tree_idx] is None:
+            parsed[tree_idx] = _json_loads(raw_dumps[tree_idx])
+        yield parsed[tree_idx]
+
+@functools.lru_cache(maxsize=None)
+def _load_config_cached(language: str, config_dir: str) -> Dict:
+    """Load and parse a language config file once per (language, dir)."""
+    config_path = os.path.join(config_dir, f"{language}_config.json")
+    with open(config_path, 'rb') as f:
+        return _json_loads(f.read())
+
+@functools.lru_cache(maxsize=None)
+def _load_templates_cached(language: str, template_dir: str) -> Dict[str, str]:
+    """Read a language's template files once per (language, dir).
+
+    The returned dict is shared across converter instances; callers must
+    treat it as read-only.
+    """
+    templates = {}
+    template_files = [
+        f"{language}_header.template",
+        f"{language}_main.template",
+        f"{language}_tree.template"
+    ]
+
+    # Add language-specific additional templates
+    if language == "rust":
+        template_files.extend([
+            f"{language}_cargo.template",
+            f"{language}_test.template"
+        ])
+
+    for template_file in template_files:
+        template_path = os.path.join(template_dir, template_file)
+        if os.path.exists(template_path):
+            with open(template_path, 'r') as f:
+                template_name = template_file.replace(f"{language}_", "").replace(".template", "")
+                templates[template_name] = f.read()
+
+    return templates
+
 class XGBoostLanguageConverter:
     """
     Generalized XGBoost to programming language converter using template system.
@@ -21,98 +92,86 @@ class XGBoostLanguageConverter:
         self.config_dir = config_dir
         self.template_dir = template_dir
         
-        # Load language configuration
-        config_path = os.path.join(config_dir, f"{language}_config.json")
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+        # Load language configuration (cached per language/dir)
+        self.config = _load_config_cached(language, config_dir)
         
         # Load templates
         self.templates = self._load_templates()
-        
+
+        # Precompute the per-node constants of the tree generator: indent
+        # strings indexed by depth and the condition templates per language
+        indent_config = self.config["indentation"]
+        indent_char = " " if indent_config["type"] == "spaces" else "\t"
+        self._indent_unit = indent_char * indent_config["size"]
+        self._indent_by_depth = [self._indent_unit * d for d in range(64)]
+        self._is_rust = (self.language == "rust")
+        if self._is_rust:
+            self._condition_template_top = "let tree_result = if fixed_le(f[{}], {}) {{"
+            self._condition_template = "if fixed_le(f[{}], {}) {{"
+        else:  # ZoKrates
+            self._condition_template_top = "x = if i64_le(f[{}], {}) {{"
+            self._condition_template = "if i64_le(f[{}], {}){{"
+
+        # Precomputed literal fragments for the number formatters; plain
+        # concatenation with str() skips the format-engine scan (and the
+        # brace escaping) that an f-string pays on every call
+        if self.language == "zokrates":
+            self._fixed_point_prefixes = ('i64{sgn:true, v: ', 'i64{sgn:false, v: ')
+            self._field_prefixes = ('1", "', '0", "')
+            self._input_prefixes = ('{"sgn":true, "v": "', '{"sgn":false, "v": "')
+
+    def _indent(self, depth: int) -> str:
+        """Indent string for a node depth, from the precomputed table."""
+        try:
+            return self._indent_by_depth[depth]
+        except IndexError:
+            return self._indent_unit * depth
+
     def _load_templates(self) -> Dict[str, str]:
-        """Load all template files for the language."""
-        templates = {}
-        template_files = [
-            f"{self.language}_header.template",
-            f"{self.language}_main.template", 
-            f"{self.language}_tree.template"
-        ]
-        
-        # Add language-specific additional templates
-        if self.language == "rust":
-            template_files.extend([
-                f"{self.language}_cargo.template",
-                f"{self.language}_test.template"
-            ])
-        
-        for template_file in template_files:
-            template_path = os.path.join(self.template_dir, template_file)
-            if os.path.exists(template_path):
-                with open(template_path, 'r') as f:
-                    template_name = template_file.replace(f"{self.language}_", "").replace(".template", "")
-                    templates[template_name] = f.read()
-        
-        return templates
+        """Load all template files for the language (cached per language/dir)."""
+        return _load_templates_cached(self.language, self.template_dir)
     
     def convert_number_to_fixed_point(self, value: float) -> str:
         """Convert a number to target language's fixed-point representation."""
         fixed_point_config = self.config["data_types"]["fixed_point"]
         multiplier = fixed_point_config["precision_multiplier"]
         converted_value = int(np.round(value * multiplier, 0))
-        
-        # Handle sign
-        is_positive = converted_value >= 0
-        abs_value = abs(converted_value)
-        
-        if self.language == "zokrates":
-            return f"i64{{sgn:{'true' if is_positive else 'false'}, v: {abs_value}}}"
-        elif self.language == "rust":
-            return f"from_scaled_i64({converted_value})"
-        else:
-            # For other languages, implement their specific format
-            raise NotImplementedError(f"Fixed point conversion not implemented for {self.language}")
-    
+        return self.convert_number_to_fixed_point_from_scaled(converted_value)
+
     def convert_number_to_fixed_point_from_scaled(self, scaled_value: int) -> str:
         """Convert an already scaled integer value to target language's fixed-point representation."""
-        # Handle sign
-        is_positive = scaled_value >= 0
-        abs_value = abs(scaled_value)
-        
         if self.language == "zokrates":
-            return f"i64{{sgn:{'true' if is_positive else 'false'}, v: {abs_value}}}"
+            prefix = self._fixed_point_prefixes[0] if scaled_value >= 0 else self._fixed_point_prefixes[1]
+            return prefix + str(abs(scaled_value)) + '}'
         elif self.language == "rust":
-            return f"from_scaled_i64({scaled_value})"
+            return "from_scaled_i64(" + str(scaled_value) + ")"
         else:
             # For other languages, implement their specific format
             raise NotImplementedError(f"Fixed point conversion not implemented for {self.language}")
-    
+
     def convert_number_to_field(self, value: float) -> str:
         """Convert number to field format for language input."""
         # Use same precision as old notebook: 10^10
         converted_value = int(np.round(value * 10000000000, 0))
-        
-        is_positive = converted_value >= 0
-        abs_value = abs(converted_value)
-        
+
         if self.language == "zokrates":
-            return f'{'1' if is_positive else '0'}", "{abs_value}'
+            prefix = self._field_prefixes[0] if converted_value >= 0 else self._field_prefixes[1]
+            return prefix + str(abs(converted_value))
         elif self.language == "rust":
-            return f"{converted_value}"
+            return str(converted_value)
         else:
             raise NotImplementedError(f"Field conversion not implemented for {self.language}")
-    
+
     def convert_number_to_input(self, value: float) -> str:
         """Convert number to input format for language."""
         # Use same precision as old notebook: 10^10
         converted_value = int(np.round(value * 10000000000, 0))
-        
-        is_positive = converted_value >= 0
-        abs_value = abs(converted_value)
-        
+
         if self.language == "zokrates":
-            return f'{{"sgn":{'true' if is_positive else 'false'}, "v": "{abs_value}"}}'
+            prefix = self._input_prefixes[0] if converted_value >= 0 else self._input_prefixes[1]
+            return prefix + str(abs(converted_value)) + '"}'
         elif self.language == "rust":
-            return f"{converted_value}"
+            return str(converted_value)
         else:
             raise NotImplementedError(f"Input conversion not implemented for {self.language}")
     
@@ -129,66 +188,124 @@ class XGBoostLanguageConverter:
         else:
             return ', '.join(field_parts)
     
-    def _generate_tree_logic(self, tree_structure: Dict, feature_indices: List[str], depth: int) -> str:
-        """Generate code for a single decision tree."""
-        indent_config = self.config["indentation"]
-        indent_char = " " if indent_config["type"] == "spaces" else "\t"
-        indent = indent_char * (indent_config["size"] * depth)
-        
-        # Base case: leaf node
-        if 'leaf' in tree_structure:
-            # Convert leaf value with precision multiplier (10^10 as in old notebook)
-            leaf_value_scaled = int(np.round(tree_structure['leaf'] * 10000000000, 0))
-            leaf_value = self.convert_number_to_fixed_point_from_scaled(leaf_value_scaled)
-            if self.language == "rust":
-                return f"{indent}{leaf_value}\n"
-            else:
-                return f"{indent} {leaf_value}\n"
-        
-        # Split node
-        feature_idx = int(tree_structure['split'][1:])  # Remove 'f' prefix
-        feature_index = feature_indices[feature_idx]  # This should be a string like "0", "1", "2"...
-        
-        # Convert threshold with precision multiplier
-        threshold_scaled = int(np.round(tree_structure['split_condition'] * 10000000000, 0))
-        threshold = self.convert_number_to_fixed_point_from_scaled(threshold_scaled)
-        
-        # Generate condition - use numeric index for array access
-        if self.language == "rust":
-            if depth == 1:
-                condition_template = "let tree_result = if fixed_le(f[{}], {}) {{"
-            else:
-                condition_template = "if fixed_le(f[{}], {}) {{"
-        else:  # ZoKrates
-            if depth == 1:
-                condition_template = "x = if i64_le(f[{}], {}) {{"
-            else:
-                condition_template = "if i64_le(f[{}], {}){{"
-        
-        result = f"{indent}{condition_template.format(feature_index, threshold)}\n"
-        
-        # Left branch (yes)
-        yes_branch = tree_structure['children'][0]
-        result += self._generate_tree_logic(yes_branch, feature_indices, depth + 1)
-        result += f"{indent}}} else {{\n"
-        
-        # Right branch (no)
-        no_branch = tree_structure['children'][1]
-        result += self._generate_tree_logic(no_branch, feature_indices, depth + 1)
-        
-        if self.language == "rust":
-            if depth == 1:
-                result += f"{indent}}};\n"
+    def _flatten_tree(self, tree_structure: Dict) -> Tuple[List[int], List[int], List[int], np.ndarray]:
+        """Flatten a parsed tree into parallel per-node arrays.
+
+        Returns (feat, left, right, scaled): feat[i] is the split feature
+        index or -1 for a leaf, left/right are child node ids (-1 for
+        leaves), and scaled[i] is the node's leaf/threshold value scaled by
+        10^10 in one vectorized np.rint pass. The emitter then walks plain
+        integer ids instead of chasing dicts, and the result is memoized on
+        the parsed tree so repeated conversions of the same booster skip the
+        whole pass.
+        """
+        if '_flat' in tree_structure:
+            return tree_structure['_flat']
+
+        feat = []
+        left = []
+        right = []
+        values = []
+        stack = [(tree_structure, -1, 0)]
+        while stack:
+            node, parent, side = stack.pop()
+            node_id = len(values)
+            if parent >= 0:
+                if side == 0:
+                    left[parent] = node_id
+                else:
+                    right[parent] = node_id
+            feat.append(-1)
+            left.append(-1)
+            right.append(-1)
+            if 'leaf' in node:
+                values.append(node['leaf'])
             else:
-                result += f"{indent}}}\n"
-        else:  # ZoKrates
-            if depth == 1:
-                result += f"{indent} }};\n"
-                result += f"{indent} y = i64_add(y, x);\n"
+                feat[node_id] = int(node['split'][1:])  # Remove 'f' prefix
+                values.append(node['split_condition'])
+                stack.append((node['children'][1], node_id, 1))
+                stack.append((node['children'][0], node_id, 0))
+
+        scaled = np.rint(np.asarray(values, dtype=np.float64) * 10000000000).astype(np.int64)
+        flat = (feat, left, right, scaled)
+        tree_structure['_flat'] = flat
+        return flat
+
+    def _preformat_literals(self, scaled_values: np.ndarray) -> List[str]:
+        """Format every scaled node value into its language literal in bulk.
+
+        One np.where for the sign prefixes plus np.char concatenations
+        replaces a per-node formatter call for the whole tree.
+        """
+        if self.language == "zokrates":
+            prefixes = np.where(scaled_values >= 0, self._fixed_point_prefixes[0], self._fixed_point_prefixes[1])
+            literals = np.char.add(np.char.add(prefixes, np.char.mod('%d', np.abs(scaled_values))), '}')
+        elif self.language == "rust":
+            literals = np.char.add(np.char.add('from_scaled_i64(', np.char.mod('%d', scaled_values)), ')')
+        else:
+            return [self.convert_number_to_fixed_point_from_scaled(int(v)) for v in scaled_values]
+        return literals.tolist()
+
+    def _generate_tree_logic(self, tree_structure: Dict, feature_indices: List[str], depth: int, out: List[str]) -> None:
+        """Generate code for a single decision tree into the shared buffer.
+
+        Iterative depth-first walk with an explicit stack; all fragments are
+        appended to the caller's `out` list, so the code of every tree lands
+        in one buffer joined a single time at the end of the conversion.
+        """
+        is_rust = self._is_rust
+        feat, left, right, scaled = self._flatten_tree(tree_structure)
+        literals = self._preformat_literals(scaled)
+
+        # Stack entries are either (node id, depth) pairs to expand or literal
+        # strings to emit (pushed for the else/close parts of a split).
+        stack = [(0, depth)]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                out.append(item)
+                continue
+
+            node_id, node_depth = item
+            indent = self._indent(node_depth)
+            feature_idx = feat[node_id]
+
+            # Leaf node
+            if feature_idx < 0:
+                leaf_value = literals[node_id]
+                if is_rust:
+                    out.append(f"{indent}{leaf_value}\n")
+                else:
+                    out.append(f"{indent} {leaf_value}\n")
+                continue
+
+            # Split node - use numeric index for array access
+            feature_index = feature_indices[feature_idx]  # This should be a string like "0", "1", "2"...
+            threshold = literals[node_id]
+
+            if node_depth == 1:
+                condition_template = self._condition_template_top
             else:
-                result += f"{indent} }}\n"
-        
-        return result
+                condition_template = self._condition_template
+
+            out.append(f"{indent}{condition_template.format(feature_index, threshold)}\n")
+
+            if is_rust:
+                if node_depth == 1:
+                    closing = f"{indent}}};\n"
+                else:
+                    closing = f"{indent}}}\n"
+            else:  # ZoKrates
+                if node_depth == 1:
+                    closing = f"{indent} }};\n{indent} y = i64_add(y, x);\n"
+                else:
+                    closing = f"{indent} }}\n"
+
+            # Pushed in reverse so they pop as: yes branch, else, no branch, close
+            stack.append(closing)
+            stack.append((right[node_id], node_depth + 1))
+            stack.append(f"{indent}}} else {{\n")
+            stack.append((left[node_id], node_depth + 1))
     
     def convert_xgboost_to_code(self, booster, feature_names: List[str], num_trees: int) -> str:
         """
@@ -205,43 +322,41 @@ class XGBoostLanguageConverter:
         # Convert feature names to indices for ZoKrates array access
         feature_indices = self.feature_names_to_indices(feature_names)
         
-        # Get tree dumps
-        trees_dump = booster.get_dump(dump_format='json')
-        
         # Start building code
         code_parts = []
-        
+
         # Add header (helper functions, data types)
         if "header" in self.templates:
             code_parts.append(self.templates["header"])
-        
-        # Generate tree code
-        tree_codes = []
-        for tree_idx, tree_dump in enumerate(trees_dump):
-            if tree_idx >= num_trees:
-                break
-                
-            tree_structure = json.loads(tree_dump)
-            tree_logic = self._generate_tree_logic(tree_structure, feature_indices, 1)
-            
-            if "tree" in self.templates:
-                tree_code = self.templates["tree"].format(
-                    tree_idx=tree_idx,
-                    tree_logic=tree_logic
-                )
-                tree_codes.append(tree_code)
-        
-        # Generate main function
+
+        # Generate tree code into one shared buffer; the tree template is
+        # split around its $tree_logic slot once so only the small head/tail
+        # pieces are substituted per tree
+        out = []
+        if "tree" in self.templates:
+            tree_head, _, tree_tail = self.templates["tree"].partition("$tree_logic")
+            tree_head = Template(tree_head)
+            tree_tail = Template(tree_tail)
+            for tree_idx, tree_structure in enumerate(_iter_parsed_trees(booster, num_trees)):
+                if tree_idx > 0:
+                    out.append("\n")
+                out.append(tree_head.safe_substitute(tree_idx=tree_idx))
+                self._generate_tree_logic(tree_structure, feature_indices, 1, out)
+                out.append(tree_tail.safe_substitute(tree_idx=tree_idx))
+        tree_code = ''.join(out)
+
+        # Generate main function; splitting around $tree_code avoids scanning
+        # the (potentially huge) generated body for placeholders
         if "main" in self.templates:
-            main_code = self.templates["main"].format(
-                num_features=len(feature_names),
-                tree_code="\n".join(tree_codes)
-            )
+            main_head, main_sep, main_tail = self.templates["main"].partition("$tree_code")
+            main_code = Template(main_head).safe_substitute(num_features=len(feature_names))
+            if main_sep:
+                main_code += tree_code + Template(main_tail).safe_substitute(num_features=len(feature_names))
             code_parts.append(main_code)
         
         # Add tests for Rust
         if self.language == "rust" and "test" in self.templates:
-            test_code = self.templates["test"].format(
+            test_code = Template(self.templates["test"]).safe_substitute(
                 num_features=len(feature_names)
             )
             code_parts.append(test_code)